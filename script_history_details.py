@@ -1,17 +1,65 @@
 import json
+import hashlib
+import time
+import re
 import getpass
 import openpyxl
 from openpyxl import Workbook
 import urllib3
 import argparse
 import os
+import sys
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
+from operator import itemgetter
 import logging
 
+try:
+    import orjson  # Faster JSON encode/decode when available
+except ImportError:
+    orjson = None
+
 # Disable insecure HTTPS warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Number of concurrent script history requests (kept below the HTTP connection pool size)
+MAX_WORKERS = 16
+
+# Static parts of the device list query; only the ADOM URL, platform filter and session vary per call
+DEVICE_LIST_REQUEST = {
+    "loadsub": 0,
+    "fields": ["sn", "hostname"],
+    "option": ["no meta"]  # Skip per-device meta fields, only sn/hostname are used
+}
+
+# Static parts of the script history (task list) query; only params vary per device
+HISTORY_REQUEST = {
+    "url": "/gui/adom/dvm/task",
+    "method": "get"
+}
+
+# Extracts (hostname, sn) from a device list record
+get_hostname_sn = itemgetter('hostname', 'sn')
+
+# Marker preceding the device hostname in the script log
+START_MARKER = "Starting log (Run on device)\n\n"
+
+# Values reported by "fnsysctl cat /proc/driver/rtc"
+RTC_TIME_RE = re.compile(r'rtc_time\s*:\s*(\d{1,2})\s*:\s*(\d{2})\s*:\s*(\d{2})')
+RTC_DATE_RE = re.compile(r'rtc_date\s*:\s*(\S+)')
+
+# Directory holding cached FortiManager responses (see --cache-ttl)
+CACHE_DIR = ".fmg_cache"
+
+# File holding reusable FortiManager session tokens/cookies (see --session-cache)
+SESSION_CACHE_FILE = os.path.expanduser("~/.fmg_session.json")
+# Seconds a cached session is trusted, kept below the FortiManager admin idle timeout
+SESSION_CACHE_LIFETIME = 300
+
 def parse_arguments():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description='Collect FortiGate script history from FortiManager.')
@@ -22,6 +70,8 @@ def parse_arguments():
     parser.add_argument('--adom', type=str, help='ADOM', required=False)
     parser.add_argument('--platform', type=str, help='Desired platform (FortiGate-VM64, FortiGate-60F, FortiGate-100F)', required=False)
     parser.add_argument('--script', type=str, help='Script name', required=False)
+    parser.add_argument('--cache-ttl', type=int, default=0, help='Reuse cached FortiManager responses younger than this many seconds (0 disables the cache)')
+    parser.add_argument('--session-cache', action='store_true', help=f'Reuse the FortiManager session across runs via {SESSION_CACHE_FILE}')
     parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose mode')
     
     return parser.parse_args()
@@ -33,21 +83,117 @@ def configure_logging(verbose):
     else:
         logging.basicConfig(level=logging.INFO)
 
+def get_parameter(value, env_var, prompt, secret=False):
+    """Return the argument value, the environment variable, or prompt for it when stdin is a terminal."""
+    value = value or os.getenv(env_var)
+    if not value and sys.stdin is not None and sys.stdin.isatty():
+        value = getpass.getpass(f"{prompt}: ") if secret else input(f"{prompt}: ")
+    if not value:
+        # Fail fast instead of blocking on stdin or logging in without everything required
+        raise SystemExit(f"Missing required parameter: {prompt} (set {env_var} or pass it on the command line)")
+    return value
+
 def get_input_parameters(args):
     """Get input parameters from environment variables, command line arguments, or prompt the user."""
-    fmg_ip = args.fmg or os.getenv('FMG_IP') or input("FortiManager IP/FQDN: ")
-    user = args.user or os.getenv('FMG_USER') or input("FortiManager Username: ")
-    passwd = args.password or os.getenv('FMG_PASS') or getpass.getpass("FortiManager Password: ")  # Changed args.pass to args.password
-    adom = args.adom or os.getenv('FMG_ADOM') or input("ADOM: ")
-    platform = args.platform or os.getenv('FMG_PLATFORM') or input("Desired platform (FortiGate-VM64, FortiGate-60F, FortiGate-100F): ")
-    script_name = args.script or os.getenv('FMG_SCRIPT') or input("Script name: ")
+    fmg_ip = get_parameter(args.fmg, 'FMG_IP', "FortiManager IP/FQDN")
+    user = get_parameter(args.user, 'FMG_USER', "FortiManager Username")
+    passwd = get_parameter(args.password, 'FMG_PASS', "FortiManager Password", secret=True)  # Changed args.pass to args.password
+    adom = get_parameter(args.adom, 'FMG_ADOM', "ADOM")
+    platform = get_parameter(args.platform, 'FMG_PLATFORM', "Desired platform (FortiGate-VM64, FortiGate-60F, FortiGate-100F)")
+    script_name = get_parameter(args.script, 'FMG_SCRIPT', "Script name")
     
     return fmg_ip, user, passwd, adom, platform, script_name
 
-def login_fmg(fmg_ip, user, passwd):
+def dumps_json(payload):
+    """Serialize a request payload to JSON bytes."""
+    if orjson:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode()
+
+def loads_json(response):
+    """Deserialize a JSON response body."""
+    if orjson:
+        return orjson.loads(response.content)
+    return response.json()
+
+def cache_path(*key_parts):
+    """Return the cache file path for the given key parts."""
+    key = hashlib.sha256("|".join(key_parts).encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+def read_cache(key_parts, cache_ttl):
+    """Return cached data for the key if it is younger than cache_ttl seconds, otherwise None."""
+    if cache_ttl <= 0:
+        return None
+
+    path = cache_path(*key_parts)
+    try:
+        if os.path.getmtime(path) <= time.time() - cache_ttl:
+            return None
+        with open(path, 'r') as cache_file:
+            data = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+    logging.debug("Cache hit for %s", key_parts)
+    return data
+
+def write_cache(key_parts, data, cache_ttl):
+    """Store data in the cache for the key; the file is replaced atomically."""
+    if cache_ttl <= 0:
+        return
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = cache_path(*key_parts)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as cache_file:
+        json.dump(data, cache_file)
+    os.replace(tmp_path, path)
+
+def load_session_cache(fmg_ip, user):
+    """Return a cached (session, cookies) pair for the FortiManager user if it has not expired, otherwise None."""
+    try:
+        with open(SESSION_CACHE_FILE, 'r') as cache_file:
+            entry = json.load(cache_file).get(f"{fmg_ip}|{user}")
+    except (OSError, ValueError):
+        return None
+
+    if not entry or entry["expires"] <= time.time():
+        return None
+    return entry["session"], entry["cookies"]
+
+def save_session_cache(fmg_ip, user, session, cookies):
+    """Store the session and cookies for the FortiManager user; the file is only readable by its owner."""
+    try:
+        with open(SESSION_CACHE_FILE, 'r') as cache_file:
+            entries = json.load(cache_file)
+    except (OSError, ValueError):
+        entries = {}
+
+    entries[f"{fmg_ip}|{user}"] = {
+        "session": session,
+        "cookies": dict(cookies),
+        "expires": time.time() + SESSION_CACHE_LIFETIME
+    }
+
+    tmp_path = f"{SESSION_CACHE_FILE}.{os.getpid()}.tmp"
+    with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as cache_file:
+        json.dump(entries, cache_file)
+    os.replace(tmp_path, SESSION_CACHE_FILE)
+
+def create_http_session():
+    """Create a requests session with connection pooling so all FMG calls reuse the same connections."""
+    session_http = requests.Session()
+    # Transient connection errors and 5xx responses are retried with exponential backoff
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504], allowed_methods={'POST'})
+    session_http.mount('https://', HTTPAdapter(max_retries=retry, pool_connections=10, pool_maxsize=20))
+    session_http.verify = False
+    session_http.headers.update({'Content-Type': 'application/json'})
+    return session_http
+
+def login_fmg(fmg_ip, user, passwd, session_http):
     """First authentication to obtain session token."""
     auth_url = f"https://{fmg_ip}/jsonrpc"
-    headers = {'Content-Type': 'application/json'}
     payload = {
         "id": 1,
         "method": "exec",
@@ -59,23 +205,27 @@ def login_fmg(fmg_ip, user, passwd):
         "verbose": 1
     }
 
-    logging.debug(f"Request to {auth_url}: {json.dumps(payload)}")
-    response = requests.post(auth_url, json=payload, headers=headers, verify=False)
-    result = response.json()
-    logging.debug(f"Response from {auth_url}: {result}")
+    logging.debug("Request to %s: %s", auth_url, payload)
+    response = session_http.post(auth_url, data=dumps_json(payload))
+    result = loads_json(response)
+    logging.debug("Response from %s: %s", auth_url, result)
 
     if result["result"][0]["status"]["code"] == 0:
         session = result["session"]
+        # The first login may already have set the flatui cookies on the shared HTTP session
+        if "CURRENT_SESSION" in session_http.cookies and "HTTP_CSRF_TOKEN" in session_http.cookies:
+            logging.debug("flatui cookies already set by %s, skipping second authentication", auth_url)
+            return session, requests.utils.dict_from_cookiejar(session_http.cookies)
+
         # Perform second authentication immediately after the first one
-        cookies = login_fmg_flatui(fmg_ip, user, passwd)
+        cookies = login_fmg_flatui(fmg_ip, user, passwd, session_http)
         return session, cookies
     else:
         raise Exception("First authentication failed")
 
-def login_fmg_flatui(fmg_ip, user, passwd):
+def login_fmg_flatui(fmg_ip, user, passwd, session_http):
     """Second authentication to obtain CURRENT_SESSION and HTTP_CSRF_TOKEN cookies."""
     auth_url = f"https://{fmg_ip}/cgi-bin/module/flatui_auth"
-    headers = {'Content-Type': 'application/json'}
     payload = {
         "url": "/gui/userauth",
         "method": "login",
@@ -86,9 +236,9 @@ def login_fmg_flatui(fmg_ip, user, passwd):
         }
     }
 
-    logging.debug(f"Request to {auth_url}: {json.dumps(payload)}")
-    response = requests.post(auth_url, json=payload, headers=headers, verify=False)
-    logging.debug(f"Response from {auth_url}: {response.cookies}")
+    logging.debug("Request to %s: %s", auth_url, payload)
+    response = session_http.post(auth_url, data=dumps_json(payload))
+    logging.debug("Response from %s: %s", auth_url, response.cookies)
 
     if response.status_code == 200:
         cookies = response.cookies
@@ -96,97 +246,285 @@ def login_fmg_flatui(fmg_ip, user, passwd):
     else:
         raise Exception("Second authentication failed")
 
-def get_device_list(fmg_ip, session, adom, platform):
+class SessionExpired(Exception):
+    """Raised when FortiManager rejects a request because the session is no longer valid."""
+
+class FMGAuth:
+    """FortiManager session token and cookies shared by all requests, renewed when they expire."""
+
+    def __init__(self, fmg_ip, user, passwd, session_http, session_cache=False):
+        self.fmg_ip = fmg_ip
+        self.user = user
+        self.passwd = passwd
+        self.session_http = session_http
+        self.session_cache = session_cache
+        # (session, cookies) replaced as a single tuple so threads never see a mixed pair
+        self.credentials = (None, None)
+        self.lock = threading.Lock()
+
+    def login(self):
+        """Authenticate (or reuse a cached session) and store the session token and cookies."""
+        cached_session = load_session_cache(self.fmg_ip, self.user) if self.session_cache else None
+        if cached_session:
+            self.credentials = tuple(cached_session)
+            return
+
+        self.relogin()
+
+    def relogin(self):
+        """Authenticate against FortiManager, replacing any stale cookies."""
+        self.session_http.cookies.clear()
+        self.credentials = login_fmg(self.fmg_ip, self.user, self.passwd, self.session_http)
+        if self.session_cache:
+            save_session_cache(self.fmg_ip, self.user, *self.credentials)
+
+    def refresh(self, stale_credentials):
+        """Log in again unless another thread already replaced the stale credentials."""
+        with self.lock:
+            if self.credentials is stale_credentials:
+                logging.info("FortiManager session expired, logging in again")
+                self.relogin()
+
+def is_session_expired(response, result=None):
+    """Return True if the response shows the FortiManager session is not (or no longer) logged in."""
+    if response.status_code in (401, 403):
+        return True
+    try:
+        return result["result"][0]["status"]["code"] == -11
+    except (KeyError, IndexError, TypeError):
+        return False
+
+def with_relogin(auth, call):
+    """Run call(session, cookies), logging in again and retrying once if the session expired."""
+    credentials = auth.credentials
+    try:
+        return call(*credentials)
+    except SessionExpired:
+        auth.refresh(credentials)
+        return call(*auth.credentials)
+
+def get_device_list(fmg_ip, session, adom, platform, session_http, cache_ttl=0):
     """Get the list of devices from FortiManager."""
+    cache_key = (fmg_ip, adom, platform, "device_list")
+    cached = read_cache(cache_key, cache_ttl)
+    if cached is not None:
+        return cached
+
     api_url = f"https://{fmg_ip}/jsonrpc"
-    headers = {'Content-Type': 'application/json'}
     payload = {
         "method": "get",
         "params": [{
-            "loadsub": 0,
+            **DEVICE_LIST_REQUEST,
             "url": f"/dvmdb/adom/{adom}/device",
-            "fields": ["sn", "hostname"],
             "filter": [["platform_str", "==", platform]]
         }],
         "session": session,
         "id": 1
     }
 
-    logging.debug(f"Request to {api_url}: {json.dumps(payload)}")
-    response = requests.post(api_url, json=payload, headers=headers, verify=False)
-    logging.debug(f"Response from {api_url}: {response.json()}")
+    logging.debug("Request to %s: %s", api_url, payload)
+    response = session_http.post(api_url, data=dumps_json(payload))
+    result = loads_json(response)
+    logging.debug("Response from %s: %s", api_url, result)
+
+    if is_session_expired(response, result):
+        raise SessionExpired("Session expired while retrieving device list")
 
-    result = response.json()
     if "result" in result and result["result"] and "data" in result["result"][0]:
-        return result["result"][0]["data"]
+        device_list = result["result"][0]["data"]
+        write_cache(cache_key, device_list, cache_ttl)
+        return device_list
     else:
         raise Exception("Failed to retrieve device list or no devices found")
 
-def get_script_history(fmg_ip, hostname, session, cookies):
+def get_script_history(fmg_ip, hostname, session, cookies, session_http):
     """Get script execution history for a device."""
+    api_url = f"https://{fmg_ip}/cgi-bin/module/flatui_proxy"
+    payload = {**HISTORY_REQUEST, "params": {"deviceName": hostname, "adomName": "root"}}
+
+    logging.debug("Request to %s: %s", api_url, payload)
+    response = session_http.post(api_url, data=dumps_json(payload), cookies=cookies)
+    if is_session_expired(response):
+        raise SessionExpired(f"Session expired while retrieving script history for {hostname}")
+
+    result = loads_json(response)
+    logging.debug("Response from %s: %s", api_url, result)
+
+    if is_session_expired(response, result):
+        raise SessionExpired(f"Session expired while retrieving script history for {hostname}")
+
+    return result
+
+def is_history_ok(entry):
+    """Return True if a task list result entry holds data and a zero status."""
+    if not isinstance(entry, dict) or "data" not in entry:
+        return False
+    status = entry.get("status") or {}
+    return isinstance(status, dict) and status.get("code", 0) == 0
+
+def get_script_history_parallel(fmg_ip, hostnames, auth, session_http):
+    """Get script execution history for each device with one request per device, run concurrently.
+
+    A device whose request fails gets the raised exception instead of its history.
+    """
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(
+                with_relogin, auth,
+                lambda session, cookies, hostname=hostname: get_script_history(fmg_ip, hostname, session, cookies, session_http)
+            )
+            for hostname in hostnames
+        ]
+
+    histories = []
+    for hostname, future in zip(hostnames, futures):
+        try:
+            histories.append(future.result())
+        except Exception as e:
+            logging.warning("Failed to retrieve script history for %s: %s", hostname, e)
+            histories.append(e)
+
+    return histories
+
+def get_script_history_cached(fmg_ip, hostnames, auth, session_http, cache_ttl=0):
+    """Get script execution history for all devices, serving fresh entries from the cache."""
+    histories = {hostname: read_cache((fmg_ip, hostname, "script_history"), cache_ttl) for hostname in hostnames}
+    missing = [hostname for hostname, history in histories.items() if history is None]
+
+    fetched = get_script_history_batch(fmg_ip, missing, auth, session_http)
+    for hostname, history in zip(missing, fetched):
+        # Only cache successful replies so one failed run does not stick for the whole TTL
+        if not isinstance(history, Exception) and history.get("result") and is_history_ok(history["result"][0]):
+            write_cache((fmg_ip, hostname, "script_history"), history, cache_ttl)
+        histories[hostname] = history
+
+    return [histories[hostname] for hostname in hostnames]
+
+def post_script_history_batch(api_url, payload, cookies, session_http):
+    """Send a batched script history request and return (response, decoded result); either may be None."""
+    try:
+        response = session_http.post(api_url, data=dumps_json(payload), cookies=cookies)
+    except requests.RequestException as e:
+        logging.warning("Batched script history request failed: %s", e)
+        return None, None
+
+    try:
+        result = loads_json(response)
+    except ValueError:
+        result = None
+    logging.debug("Response from %s: %s", api_url, result)
+
+    return response, result
+
+def is_batch_session_expired(response, result):
+    """Return True if the batched reply, or any entry in it, shows the session is no longer logged in."""
+    if response is None:
+        return False
+    if is_session_expired(response):
+        return True
+    entries = result.get("result") if isinstance(result, dict) else None
+    return isinstance(entries, list) and any(is_session_expired(response, {"result": [entry]}) for entry in entries)
+
+def get_script_history_batch(fmg_ip, hostnames, auth, session_http):
+    """Get script execution history for all devices in a single batched request.
+
+    Falls back to per-device requests if FortiManager rejects the batched form, and
+    retries only the failed devices individually if some entries fail. An expired
+    session is renewed and the batch retried once before falling back.
+    """
+    if not hostnames:
+        return []
+
     api_url = f"https://{fmg_ip}/cgi-bin/module/flatui_proxy"
     payload = {
-        "url": "/gui/adom/dvm/task",
         "method": "get",
-        "params": {
-            "deviceName": hostname,
-            "adomName": "root"
-        }
+        "params": [
+            {**HISTORY_REQUEST, "params": {"deviceName": hostname, "adomName": "root"}}
+            for hostname in hostnames
+        ]
     }
 
-    logging.debug(f"Request to {api_url}: {json.dumps(payload)}")
-    response = requests.post(api_url, json=payload, cookies=cookies, verify=False)
-    logging.debug(f"Response from {api_url}: {response.json()}")
+    logging.debug("Request to %s: %s", api_url, payload)
+    credentials = auth.credentials
+    response, result = post_script_history_batch(api_url, payload, credentials[1], session_http)
 
-    return response.json()
+    # Renew an expired session and retry the whole batch once with the new cookies
+    if is_batch_session_expired(response, result):
+        auth.refresh(credentials)
+        response, result = post_script_history_batch(api_url, payload, auth.credentials[1], session_http)
+
+    # The batched response must hold one result per hostname, in request order
+    if not (response is not None and response.status_code == 200 and isinstance(result, dict)
+            and isinstance(result.get("result"), list) and len(result["result"]) == len(hostnames)):
+        logging.info("Batched script history request not supported, falling back to per-device requests")
+        return get_script_history_parallel(fmg_ip, hostnames, auth, session_http)
+
+    entries = result["result"]
+
+    # Keep the successful entries and fetch only the failed devices individually
+    histories = [{"result": [entry]} if is_history_ok(entry) else None for entry in entries]
+    failed = [hostname for hostname, history in zip(hostnames, histories) if history is None]
+    if failed:
+        logging.info("Batched script history failed for %d device(s), retrying them individually", len(failed))
+        retried = iter(get_script_history_parallel(fmg_ip, failed, auth, session_http))
+        histories = [history if history is not None else next(retried) for history in histories]
+
+    return histories
 
 def parse_script_history(history, script_name):
     """Parse the script history and return the desired output."""
     # Ensure the history result contains data and it's in the expected format
-    if "result" not in history or not history["result"] or "data" not in history["result"][0]:
+    result = history.get("result")
+    data = result[0].get("data") if result else None
+    if data is None:
         print(f"No script history found for {script_name}")
         return None, None, None
 
-    for entry in history["result"][0]["data"]:
-        # Check if the entry matches the desired script name
-        if entry.get("script_name") == script_name:
-            content = entry.get("content", "")
-            
-            # Find hostname: extract between "Starting log (Run on device)\n\n" and the next "  "
-            start_marker = "Starting log (Run on device)\n\n"
-            if start_marker in content:
-                start_index = content.find(start_marker) + len(start_marker)
-                end_index = content.find("  ", start_index)
-                hostname = content[start_index:end_index].strip()
-            else:
-                hostname = "Unknown"
-
-            # Extract rtc_time and rtc_date
-            rtc_time = ""
-            rtc_date = ""
-            lines = content.split("\n")
-            for line in lines:
-                if "rtc_time" in line:
-                    rtc_time = line.split(":")[1].strip() + ":" + line.split(":")[2].strip() + ":" + line.split(":")[3].strip()
-                if "rtc_date" in line:
-                    rtc_date = line.split(":")[1].strip()
-
-            return hostname, rtc_time, rtc_date
+    # Tasks are listed oldest first, so scan from the end to find the most recent run
+    for entry in reversed(data):
+        # Skip entries for other scripts before touching their content
+        if entry.get("script_name") != script_name:
+            continue
+
+        content = entry.get("content", "")
+
+        # Find hostname: extract between START_MARKER and the next "  "
+        _, found, remainder = content.partition(START_MARKER)
+        if found:
+            hostname = remainder[:remainder.find("  ")].strip()
+        else:
+            hostname = "Unknown"
+            remainder = content
+
+        # Extract rtc_time and rtc_date (the command output follows the start marker)
+        time_match = RTC_TIME_RE.search(remainder)
+        rtc_time = ":".join(time_match.groups()) if time_match else ""
+        date_match = RTC_DATE_RE.search(remainder)
+        rtc_date = date_match.group(1) if date_match else ""
+
+        return hostname, rtc_time, rtc_date
 
     return None, None, None
 
-def save_to_excel(data, filename_prefix):
-    """Save parsed data to an Excel file with UTC timestamp in the filename."""
+def save_to_excel(data, filename_prefix, errors=()):
+    """Save parsed data (and any per-device errors) to an Excel file with UTC timestamp in the filename."""
     utc_suffix = datetime.utcnow().strftime('%m%d%y_%H%M%S')
     filename = f"{filename_prefix}_{utc_suffix}.xlsx"
     
-    workbook = Workbook()
-    sheet = workbook.active
+    # Write-only mode streams rows to the file instead of keeping every cell in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
     sheet.append(["Hostname", "SN", "rtc_time", "rtc_date"])
 
     for row in data:
         sheet.append(row)
 
+    if errors:
+        error_sheet = workbook.create_sheet("Errors")
+        error_sheet.append(["Hostname", "SN", "Error"])
+        for row in errors:
+            error_sheet.append(row)
+
     workbook.save(filename)
     print(f"Data has been saved to {filename}")
 
@@ -196,25 +534,42 @@ def main():
     
     fmg_ip, user, passwd, adom, platform, script_name = get_input_parameters(args)
     
+    # Single HTTP session so every request reuses pooled keep-alive connections
+    session_http = create_http_session()
+
     try:
         # First and second authentication (session and cookies are obtained here)
-        session, cookies = login_fmg(fmg_ip, user, passwd)
+        auth = FMGAuth(fmg_ip, user, passwd, session_http, args.session_cache)
+        auth.login()
 
         # Fetch the list of devices
-        device_list = get_device_list(fmg_ip, session, adom, platform)
+        device_list = with_relogin(
+            auth,
+            lambda session, cookies: get_device_list(fmg_ip, session, adom, platform, session_http, args.cache_ttl)
+        )
+
+        # Fetch script history for all devices; results are aligned with device_list
+        hostnames = [device['hostname'] for device in device_list]
+        histories = get_script_history_cached(fmg_ip, hostnames, auth, session_http, args.cache_ttl)
+
+        parsed_data = [None] * len(device_list)
+        idx = 0
+        errors = []
+        for device, script_history in zip(device_list, histories):
+            hostname, sn = get_hostname_sn(device)
+            if isinstance(script_history, Exception):  # Request failed for this device only
+                errors.append((hostname, sn, str(script_history)))
+                continue
 
-        parsed_data = []
-        for device in device_list:
-            hostname = device['hostname']
-            sn = device['sn']
-            script_history = get_script_history(fmg_ip, hostname, session, cookies)
-            parsed_result = parse_script_history(script_history, script_name)
+            hostname_out, rtc_time, rtc_date = parse_script_history(script_history, script_name)
 
-            if parsed_result[0]:  # If parsing was successful
-                parsed_data.append([parsed_result[0], sn, parsed_result[1], parsed_result[2]])
+            if hostname_out:  # If parsing was successful
+                parsed_data[idx] = (hostname_out, sn, rtc_time, rtc_date)
+                idx += 1
+        parsed_data = parsed_data[:idx]
 
         # Save the parsed data to an Excel file
-        save_to_excel(parsed_data, 'fortigate_script_history')
+        save_to_excel(parsed_data, 'fortigate_script_history', errors)
 
     except Exception as e:
         print(f"An error occurred: {e}")